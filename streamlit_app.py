@@ -1,88 +1,128 @@
 import streamlit as st
 import geopandas as gpd
 import folium
+import shapely
 from shapely.geometry import Point
 import json
-import pandas as pd
+import numpy as np
 import streamlit.components.v1 as components
-import os
-import atexit
 import plotly.express as px
 
+PARCELS_PATH = "optimized.parquet"
+PARCEL_COLUMNS = ['OWNERNME1', 'PLACENAME', 'ZIPCODE', 'SCHOOLDIST', 'ESTFMKVALU', 'PSTLADRESS', 'SITEADRESS', 'GISACRES', 'URL', 'geometry']
+UTM_CRS = "EPSG:32616"
+MAP_PROPERTIES = ['OWNERNME1', 'GISACRES', 'ESTFMKVALU', 'tax_site']
+# Decimal places kept in map coordinates; 6 is roughly 10 cm, well below parcel-boundary accuracy
+MAP_COORD_DECIMALS = 6
 
-# Cache the GeoJSON data with minimal processing
-@st.cache_data
+
+# Cache the GeoJSON data with minimal processing. cache_resource hands every rerun the same
+# frame instead of a deep copy, so callers must treat it as read-only.
+@st.cache_resource
 def load_parcels():
     try:
-        gdf = gpd.read_parquet('optimized.parquet')
+        # Only the columns the app uses are read from the parquet file
+        gdf = gpd.read_parquet(PARCELS_PATH, columns=PARCEL_COLUMNS)
         if gdf.crs != "EPSG:4326":
             gdf = gdf.to_crs("EPSG:4326")
-        return gdf[['OWNERNME1', 'PLACENAME', 'ZIPCODE', 'SCHOOLDIST', 'ESTFMKVALU', 'PSTLADRESS', 'SITEADRESS', 'GISACRES', 'URL', 'geometry']]
+        # Low-cardinality columns used for isin filters are stored as categoricals, and owner
+        # names as Arrow strings so the substring search runs in Arrow's compute kernels
+        dtypes = {col: 'category' for col in ('ZIPCODE', 'PLACENAME', 'SCHOOLDIST')}
+        dtypes['OWNERNME1'] = 'string[pyarrow]'
+        # Range-filtered numbers are narrowed to 32 bits: acreage keeps every stored digit as
+        # float32, and market values are whole dollars that can exceed float32's exact range
+        dtypes['GISACRES'] = np.float32
+        dtypes['ESTFMKVALU'] = np.int32
+        # Centroids and bounding boxes never change, so compute them once in vectorized GEOS
+        # calls and keep them as plain float columns that travel with every filtered slice
+        centroids = shapely.centroid(gdf.geometry.values)
+        bounds = shapely.bounds(gdf.geometry.values)
+        gdf = gdf.astype(dtypes).assign(
+            centroid_x=shapely.get_x(centroids),
+            centroid_y=shapely.get_y(centroids),
+            minx=bounds[:, 0],
+            miny=bounds[:, 1],
+            maxx=bounds[:, 2],
+            maxy=bounds[:, 3],
+            # Distance queries run against this pre-projected copy instead of calling to_crs per search
+            geometry_utm=gdf.geometry.to_crs(UTM_CRS)
+        )
+        gdf['geometry_utm'].sindex  # Force the STRtree to be built now rather than on the first query
+        # Filter options come straight from the categoricals, whose categories are already unique and sorted
+        filter_options = {
+            'zipcodes': np.asarray(gdf['ZIPCODE'].cat.categories, dtype=str),
+            'placenames': np.asarray(gdf['PLACENAME'].cat.categories, dtype=str),
+            'schooldists': np.asarray(gdf['SCHOOLDIST'].cat.categories, dtype=str),
+            'estfmkvalu_min': 0,
+            'estfmkvalu_max': 1000000000
+        }
+        return gdf, filter_options
     except FileNotFoundError:
         st.error("Parcel data file not found. Please ensure 'optimized.parquet' exists.")
-        return None
+        return None, None
     except Exception as e:
         st.error(f"Error loading parcel data: {str(e)}")
-        return None
+        return None, None
 
-# Cache filter options as a dictionary
-@st.cache_data
-def get_filter_options(zipcodes, placenames, schooldists):
-    return {
-        'zipcodes': sorted(zipcodes),
-        'placenames': sorted(placenames),
-        'schooldists': sorted(schooldists),
-        'estfmkvalu_min': 0,
-        'estfmkvalu_max': 1000000000
-    }
+# Boolean mask of rows whose category is in allowed, via a lookup table over the category codes
+def category_mask(series, allowed):
+    # The trailing False slot is hit by missing values, whose code is -1
+    lookup = np.append(series.cat.categories.isin(allowed), False)
+    return lookup[series.cat.codes.to_numpy()]
 
 # Optimized filter function
 def filter_parcels(gdf, acres_min, acres_max, owner_name, placenames, zipcodes, schooldists, estfmkvalu_min, estfmkvalu_max, lat=None, lon=None, distance_miles=None):
-    filtered = gdf.copy()
-    
-    mask = (filtered['GISACRES'].between(acres_min, acres_max, inclusive='both'))
+    # Combine every predicate into a single NumPy mask in place, skipping pandas alignment
+    acres = gdf['GISACRES'].to_numpy()
+    mask = acres >= acres_min
+    mask &= acres <= acres_max
     if owner_name:
-        mask &= filtered['OWNERNME1'].str.contains(owner_name, case=False, na=False)
+        mask &= gdf['OWNERNME1'].str.contains(owner_name, case=False, na=False, regex=False).to_numpy(dtype=bool)
     if placenames:
-        mask &= filtered['PLACENAME'].isin(placenames)
+        mask &= category_mask(gdf['PLACENAME'], placenames)
     if zipcodes:
-        mask &= filtered['ZIPCODE'].isin(zipcodes)
+        mask &= category_mask(gdf['ZIPCODE'], zipcodes)
     if schooldists:
-        mask &= filtered['SCHOOLDIST'].isin(schooldists)
+        mask &= category_mask(gdf['SCHOOLDIST'], schooldists)
     if estfmkvalu_min is not None and estfmkvalu_max is not None:
-        mask &= filtered['ESTFMKVALU'].between(estfmkvalu_min, estfmkvalu_max, inclusive='both')
-    
-    filtered = filtered[mask]
+        values = gdf['ESTFMKVALU'].to_numpy()
+        mask &= values >= estfmkvalu_min
+        mask &= values <= estfmkvalu_max
     
     if lat and lon and distance_miles:
         if not (42.0 <= lat <= 44.0 and -89.0 <= lon <= -87.0):
             st.error("Coordinates out of valid range for Waukesha County.")
             return gpd.GeoDataFrame()
-        point = Point(lon, lat)
-        point_gdf = gpd.GeoDataFrame([{'geometry': point}], crs="EPSG:4326")
-        utm_crs = "EPSG:32616"
-        point_gdf = point_gdf.to_crs(utm_crs)
-        filtered = filtered.to_crs(utm_crs)
+        point = gpd.GeoSeries([Point(lon, lat)], crs="EPSG:4326").to_crs(UTM_CRS)[0]
         distance_meters = distance_miles * 1609.34
-        buffered_point = point_gdf.geometry[0].buffer(distance_meters)
-        filtered = filtered[filtered.geometry.intersects(buffered_point)]
-        filtered = filtered.to_crs("EPSG:4326")
+        buffered_point = point.buffer(distance_meters)
+        shapely.prepare(buffered_point)  # Build the prepared geometry once for all exact tests
+        # The prebuilt R-tree narrows the search to parcels whose bounding boxes overlap the
+        # buffer; the exact test then only runs on those that also passed the attribute filters
+        geoms_utm = gdf['geometry_utm']
+        cand_idx = geoms_utm.sindex.query(buffered_point)
+        cand_idx = cand_idx[mask[cand_idx]]
+        hit_idx = cand_idx[shapely.intersects(geoms_utm.values[cand_idx], buffered_point)]
+        mask = np.zeros(len(gdf), dtype=bool)
+        mask[hit_idx] = True
     
-    filtered['popup_content'] = filtered.apply(
-        lambda row: (
-            f"Owner: {row['OWNERNME1']}<br>"
-            f"Acres: {row['GISACRES']}<br>"
-            f"Market Value: {row['ESTFMKVALU']}<br>"
-            f"Tax Site: <a href='{row['URL']}' target='_blank'>Link to Tax Site</a>"
-        ) if pd.notnull(row['URL']) else (
-            f"Owner: {row['OWNERNME1']}<br>"
-            f"Acres: {row['GISACRES']}<br>"
-            f"Market Value: {row['ESTFMKVALU']}<br>"
-            "Tax Site: No URL available"
-        ),
-        axis=1
+    # Only the matching rows are materialized; the full frame is never copied
+    return gdf[mask]
+
+# Tax site link HTML for each parcel, built with vectorized string ops instead of a per-row apply
+def build_tax_site_links(parcels):
+    return (
+        "<a href='" + parcels['URL'] + "' target='_blank'>Link to Tax Site</a>"
+    ).fillna("No URL available")
+
+# Full popup HTML for the standalone markers, which can't template popups from feature properties
+def build_popup_content(parcels):
+    return (
+        "Owner: " + parcels['OWNERNME1'].fillna('').astype(str)
+        + "<br>Acres: " + parcels['GISACRES'].astype(str)
+        + "<br>Market Value: " + parcels['ESTFMKVALU'].astype(str)
+        + "<br>Tax Site: " + build_tax_site_links(parcels)
     )
-    return filtered
 
 # Optimized map generation with truncation message
 def generate_map_html(filtered_gdf, map_bounds=None):
@@ -93,11 +133,26 @@ def generate_map_html(filtered_gdf, map_bounds=None):
 
     map_truncated = False
     if filtered_gdf is not None and not filtered_gdf.empty:
-        if len(filtered_gdf) > 1000:
-            geojson_data = json.loads(filtered_gdf.head(1000).to_json())
-            map_truncated = True
-        else:
-            geojson_data = json.loads(filtered_gdf.to_json())
+        map_truncated = len(filtered_gdf) > 1000
+        # Links are only built for the parcels that are actually drawn
+        shown = filtered_gdf.head(1000)
+        shown = shown.assign(tax_site=build_tax_site_links(shown))
+        
+        # Assemble the FeatureCollection directly from the geometry array and the few
+        # properties the tooltip and popup use, instead of a to_json/json.loads round trip
+        # Rounding the coordinates first keeps full double precision from bloating the HTML
+        rounded = shapely.transform(shown.geometry.values, lambda coords: coords.round(MAP_COORD_DECIMALS))
+        geometries = json.loads('[' + ','.join(shapely.to_geojson(rounded)) + ']')
+        # float32 acreage goes out as its short decimal text, not the digits of its float64 widening
+        properties = shown[MAP_PROPERTIES].astype({'GISACRES': str}).astype(object)
+        properties = properties.where(properties.notna(), None).to_dict('records')
+        geojson_data = {
+            'type': 'FeatureCollection',
+            'features': [
+                {'type': 'Feature', 'geometry': geometry, 'properties': props}
+                for geometry, props in zip(geometries, properties)
+            ]
+        }
         
         folium.GeoJson(
             geojson_data,
@@ -113,27 +168,27 @@ def generate_map_html(filtered_gdf, map_bounds=None):
                 # Append "Click for more details" to the tooltip
                 extra_html='<br><i>Click for more details</i>'
             ),
+            # The popup is templated in the browser from the same compact properties the
+            # tooltip uses, rather than shipping a prebuilt HTML string per parcel
             popup=folium.GeoJsonPopup(
-                fields=['popup_content'],
-                aliases=[''],
-                parse_html=True,
+                fields=['OWNERNME1', 'GISACRES', 'ESTFMKVALU', 'tax_site'],
+                aliases=['Owner:', 'Acres:', 'Market Value:', 'Tax Site:'],
+                localize=True,
                 max_width=300
             )
         ).add_to(m)
         
         if len(filtered_gdf) < 200:
-            for _, row in filtered_gdf.iterrows():
-                centroid = row['geometry'].centroid
+            for cx, cy, popup in zip(shown['centroid_x'].values, shown['centroid_y'].values, build_popup_content(shown).values):
                 folium.Marker(
-                    location=[centroid.y, centroid.x],
-                    popup=row['popup_content'],
+                    location=[cy, cx],
+                    popup=popup,
                     icon=folium.Icon(color='red', icon='info-sign')
                 ).add_to(m)
 
     folium.LayerControl().add_to(m)
-    map_file = "temp_map.html"
-    m.save(map_file)
-    return map_file, map_truncated
+    # Render straight to a string; there is no temp file to share between sessions
+    return m.get_root().render(), map_truncated
 
 # Filter application logic with custom sliders and reset button
 def apply_filters_from_form(gdf, filter_options):
@@ -177,57 +232,56 @@ def apply_filters_from_form(gdf, filter_options):
             reset_filters = st.form_submit_button("Reset Map")
     
     if apply_filters:
+        # Re-applying identical filters keeps the current results and map as they are
+        filter_args = (
+            acres_min, acres_max, owner_name, tuple(placenames), tuple(zipcodes), tuple(schooldists),
+            estfmkvalu_min_val, estfmkvalu_max_val, lat, lon, distance_miles
+        )
+        if filter_args == st.session_state.filter_args:
+            return None
+        st.session_state.filter_args = filter_args
         with st.spinner("Filtering parcels..."):
             return filter_parcels(
                 gdf, acres_min, acres_max, owner_name, placenames, zipcodes, schooldists, 
                 estfmkvalu_min_val, estfmkvalu_max_val, lat, lon, distance_miles
             )
     elif reset_filters:
+        st.session_state.filter_args = None
         st.session_state.filtered_gdf = None
         st.session_state.map_bounds = None
-        st.session_state.map_file = None
+        st.session_state.map_html = None
         st.session_state.map_truncated = False
         return None
     return None
 
-# Cleanup temporary files
-def cleanup():
-    if os.path.exists("temp_map.html"):
-        os.remove("temp_map.html")
-atexit.register(cleanup)
-
 # Main app
 def main():
     st.title("Waukesha County Parcel Viewer")
 
     with st.spinner("Loading parcel data..."):
-        gdf = load_parcels()
+        gdf, filter_options = load_parcels()
     if gdf is None:
         st.stop()
 
-    # Pre-compute filter options once
-    filter_options = get_filter_options(
-        gdf['ZIPCODE'].dropna().unique().tolist(),
-        gdf['PLACENAME'].dropna().unique().tolist(),
-        gdf['SCHOOLDIST'].dropna().unique().tolist()
-    )
-
     if 'filtered_gdf' not in st.session_state:
         st.session_state.filtered_gdf = None
     if 'map_bounds' not in st.session_state:
         st.session_state.map_bounds = None
-    if 'map_file' not in st.session_state:
-        st.session_state.map_file = None
+    if 'map_html' not in st.session_state:
+        st.session_state.map_html = None
     if 'map_truncated' not in st.session_state:
         st.session_state.map_truncated = False
+    if 'filter_args' not in st.session_state:
+        st.session_state.filter_args = None
 
-    # Apply filters
+    # Apply filters; the map is only rebuilt when they change, and other reruns reuse the stored HTML
     filtered_gdf = apply_filters_from_form(gdf, filter_options)
     if filtered_gdf is not None:
         st.session_state.filtered_gdf = filtered_gdf
         if not filtered_gdf.empty:
             with st.spinner("Generating map..."):
-                bounds = filtered_gdf.total_bounds
+                # Reduce the precomputed per-parcel boxes instead of asking GEOS for total_bounds
+                bounds = [filtered_gdf['minx'].min(), filtered_gdf['miny'].min(), filtered_gdf['maxx'].max(), filtered_gdf['maxy'].max()]
                 buffer_factor = 0.1
                 width = bounds[2] - bounds[0]
                 height = bounds[3] - bounds[1]
@@ -235,29 +289,22 @@ def main():
                     [bounds[1] - height * buffer_factor, bounds[0] - width * buffer_factor],
                     [bounds[3] + height * buffer_factor, bounds[2] + width * buffer_factor]
                 ]
-                st.session_state.map_file, st.session_state.map_truncated = generate_map_html(filtered_gdf, st.session_state.map_bounds)
+                st.session_state.map_html, st.session_state.map_truncated = generate_map_html(filtered_gdf, st.session_state.map_bounds)
         else:
             st.warning("No parcels match your filters.")
             st.session_state.map_bounds = None
-            st.session_state.map_file = None
+            st.session_state.map_html = None
             st.session_state.map_truncated = False
 
-    # Generate and display map based on current filtered data
-    if st.session_state.filtered_gdf is not None and not st.session_state.filtered_gdf.empty:
-        with st.spinner("Updating map..."):
-            st.session_state.map_file, st.session_state.map_truncated = generate_map_html(st.session_state.filtered_gdf, st.session_state.map_bounds)
     
     # Display map with truncation message
-    if st.session_state.map_file and os.path.exists(st.session_state.map_file):
-        with open(st.session_state.map_file, 'r') as f:
-            components.html(f.read(), width=700, height=500)
+    if st.session_state.map_html:
+        components.html(st.session_state.map_html, width=700, height=500)
         if st.session_state.map_truncated:
             st.warning("Map truncated: Only the first 1000 parcels are displayed.")
     else:
         default_map = folium.Map(location=[43.0111125, -88.2275077], zoom_start=10, max_zoom=22)
-        default_map.save("default_map.html")
-        with open("default_map.html", 'r') as f:
-            components.html(f.read(), width=700, height=500)
+        components.html(default_map.get_root().render(), width=700, height=500)
 
     # Display parcel count and data with truncation message
     if st.session_state.filtered_gdf is not None: